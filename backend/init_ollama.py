@@ -11,45 +11,47 @@ import asyncio
 import subprocess
 import sys
 
-OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
+from ollama_pool import normalize_model_name, parse_ollama_urls
+
+OLLAMA_URLS = parse_ollama_urls()
 MODEL_NAME = os.getenv('OLLAMA_MODEL', 'llama2:7b')
 
-async def wait_for_ollama():
+async def wait_for_ollama(ollama_url):
     """Ждем, пока Ollama станет доступна"""
-    print(f"Ожидание запуска Ollama на {OLLAMA_URL}...")
+    print(f"Ожидание запуска Ollama на {ollama_url}...")
     
     for i in range(30):  # Ждем максимум 30 секунд
         try:
             async with aiohttp.ClientSession() as session:
-                async with session.get(f"{OLLAMA_URL}/api/tags") as response:
+                async with session.get(f"{ollama_url}/api/tags") as response:
                     if response.status == 200:
-                        print("Ollama готова к работе!")
+                        print(f"Ollama на {ollama_url} готова к работе!")
                         return True
         except:
             pass
         
-        print(f"Попытка {i+1}/30...")
+        print(f"[{ollama_url}] Попытка {i+1}/30...")
         await asyncio.sleep(1)
     
-    print("Ошибка: Ollama не запустилась за 30 секунд")
+    print(f"Ошибка: Ollama на {ollama_url} не запустилась за 30 секунд")
     return False
 
-async def check_model():
+async def check_model(ollama_url):
     """Проверяем, установлена ли модель"""
     try:
         async with aiohttp.ClientSession() as session:
-            async with session.get(f"{OLLAMA_URL}/api/tags") as response:
+            async with session.get(f"{ollama_url}/api/tags") as response:
                 if response.status == 200:
                     data = await response.json()
-                    models = [model['name'] for model in data.get('models', [])]
-                    return MODEL_NAME in models
+                    models = [normalize_model_name(model['name']) for model in data.get('models', [])]
+                    return normalize_model_name(MODEL_NAME) in models
     except:
         pass
     return False
 
-async def pull_model():
+async def pull_model(ollama_url):
     """Скачиваем модель"""
-    print(f"Скачивание модели {MODEL_NAME}...")
+    print(f"Скачивание модели {MODEL_NAME} на {ollama_url}...")
     print("Это может занять несколько минут при первом запуске...")
     
     try:
@@ -58,9 +60,9 @@ async def pull_model():
                 "name": MODEL_NAME
             }
             
-            async with session.post(f"{OLLAMA_URL}/api/pull", json=payload) as response:
+            async with session.post(f"{ollama_url}/api/pull", json=payload) as response:
                 if response.status == 200:
-                    print(f"Модель {MODEL_NAME} успешно скачана!")
+                    print(f"Модель {MODEL_NAME} успешно скачана на {ollama_url}!")
                     return True
                 else:
                     print(f"Ошибка при скачивании модели: {response.status}")
@@ -69,9 +71,9 @@ async def pull_model():
         print(f"Ошибка при скачивании модели: {e}")
         return False
 
-async def test_model():
+async def test_model(ollama_url):
     """Тестируем модель"""
-    print("Тестирование модели...")
+    print(f"Тестирование модели на {ollama_url}...")
     
     try:
         async with aiohttp.ClientSession() as session:
@@ -85,7 +87,7 @@ async def test_model():
                 }
             }
             
-            async with session.post(f"{OLLAMA_URL}/api/generate", json=payload) as response:
+            async with session.post(f"{ollama_url}/api/generate", json=payload) as response:
                 if response.status == 200:
                     data = await response.json()
                     response_text = data.get('response', '').strip()
@@ -98,29 +100,41 @@ async def test_model():
         print(f"Ошибка при тестировании модели: {e}")
         return False
 
-async def main():
-    """Основная функция инициализации"""
-    print("=== Инициализация Ollama ===")
-    
+async def init_node(ollama_url):
+    """Инициализация одного сервера Ollama. Возвращает False, если сервер не запустился"""
     # Ждем запуска Ollama
-    if not await wait_for_ollama():
-        sys.exit(1)
+    if not await wait_for_ollama(ollama_url):
+        return False
     
     # Проверяем, установлена ли модель
-    if await check_model():
-        print(f"Модель {MODEL_NAME} уже установлена")
+    if await check_model(ollama_url):
+        print(f"Модель {MODEL_NAME} уже установлена на {ollama_url}")
     else:
         # Скачиваем модель
-        if not await pull_model():
-            print("Не удалось скачать модель. Используем fallback режим.")
-            return
+        if not await pull_model(ollama_url):
+            print(f"Не удалось скачать модель на {ollama_url}. Сервер будет исключен из пула.")
+            return True
     
     # Тестируем модель
-    if await test_model():
-        print("=== Инициализация завершена успешно! ===")
+    if not await test_model(ollama_url):
+        print(f"Модель на {ollama_url} не ответила на тестовый запрос")
+    return True
+
+async def main():
+    """Основная функция инициализации всех серверов из OLLAMA_URLS"""
+    print(f"=== Инициализация Ollama ({len(OLLAMA_URLS)} серв.) ===")
+    
+    results = await asyncio.gather(*(init_node(url) for url in OLLAMA_URLS))
+    
+    # Бэкенд запускается, если поднялся хотя бы один сервер
+    if not any(results):
+        sys.exit(1)
+    
+    if all(results):
+        print("=== Инициализация завершена ===")
     else:
         print("=== Инициализация завершена с предупреждениями ===")
-        print("Бот будет работать в fallback режиме")
+        print("Недоступные серверы будут исключены из пула до восстановления")
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
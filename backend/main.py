@@ -6,8 +6,6 @@ import random
 import asyncio
 import json
 from datetime import datetime
-import aiohttp
-import os
 
 from database import get_db, init_db
 from models import Message, MessageCreate, MessageResponse
@@ -53,6 +51,12 @@ manager = ConnectionManager()
 async def startup_event():
     """Инициализация базы данных при запуске"""
     await init_db()
+    chat_bot.pool.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Остановка проверки серверов Ollama и закрытие сессии"""
+    await chat_bot.pool.close()
 
 @app.get("/")
 async def root():
@@ -89,16 +93,16 @@ async def websocket_endpoint(websocket: WebSocket):
                 }))
                 
                 if message_data["sender"] != "Bot":
-                    asyncio.create_task(send_bot_response_ws(db, message_data["text"]))
+                    asyncio.create_task(send_bot_response_ws(db, message_data["text"], message_data["sender"]))
                     
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
-async def send_bot_response_ws(db: Session, user_message: str):
+async def send_bot_response_ws(db: Session, user_message: str, sender: str):
     """Асинхронно отправляет ответ бота через WebSocket"""
     await asyncio.sleep(random.uniform(1, 3))  # Задержка 1-3 секунды
     
-    bot_response = await chat_bot.get_response(user_message)
+    bot_response = await chat_bot.get_response(user_message, conversation_id=sender)
     
     db_message = Message(
         sender="Bot",
@@ -151,14 +155,14 @@ async def create_message(message: MessageCreate, db: Session = Depends(get_db)):
     
     # Если сообщение не от бота, генерируем ответ бота
     if message.sender != "Bot":
-        asyncio.create_task(send_bot_response(db, message.text))
+        asyncio.create_task(send_bot_response(db, message.text, message.sender))
     
     return db_message
 
 @app.post("/bot/respond")
 async def bot_respond(message: MessageCreate, db: Session = Depends(get_db)):
     """Получить ответ от бота"""
-    bot_response = await chat_bot.get_response(message.text)
+    bot_response = await chat_bot.get_response(message.text, conversation_id=message.sender)
     
     db_message = Message(
         sender="Bot",
@@ -171,11 +175,11 @@ async def bot_respond(message: MessageCreate, db: Session = Depends(get_db)):
     
     return db_message
 
-async def send_bot_response(db: Session, user_message: str):
+async def send_bot_response(db: Session, user_message: str, sender: str):
     """Асинхронно отправляет ответ бота"""
     await asyncio.sleep(random.uniform(1, 3))  # Задержка 1-3 секунды
     
-    bot_response = await chat_bot.get_response(user_message)
+    bot_response = await chat_bot.get_response(user_message, conversation_id=sender)
     
     db_message = Message(
         sender="Bot",
@@ -212,43 +216,11 @@ async def clear_messages(db: Session = Depends(get_db)):
 
 @app.get("/bot/status")
 async def bot_status():
-    """Получить статус LLM"""
+    """Получить статус LLM и каждого сервера Ollama"""
     try:
-        # Проверяем доступность Ollama
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{os.getenv('OLLAMA_URL', 'http://localhost:11434')}/api/tags") as response:
-                if response.status == 200:
-                    data = await response.json()
-                    model_name = os.getenv('OLLAMA_MODEL', 'llama2:7b')
-                    models = [model['name'] for model in data.get('models', [])]
-                    
-                    if model_name in models:
-                        # Тестируем модель
-                        test_payload = {
-                            "model": model_name,
-                            "prompt": "test",
-                            "stream": False,
-                            "options": {
-                                "temperature": 0.7,
-                                "max_tokens": 10
-                            }
-                        }
-                        
-                        async with session.post(
-                            f"{os.getenv('OLLAMA_URL', 'http://localhost:11434')}/api/generate",
-                            json=test_payload,
-                            timeout=aiohttp.ClientTimeout(total=5)
-                        ) as test_response:
-                            if test_response.status == 200:
-                                return {"status": "ready", "model": model_name}
-                            else:
-                                return {"status": "loading", "model": model_name}
-                    else:
-                        return {"status": "error", "message": f"Модель {model_name} не найдена"}
-                else:
-                    return {"status": "error", "message": "Ollama недоступна"}
+        return await chat_bot.pool.current_status()
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return {"status": "error", "message": str(e), "instances": []}
 
 if __name__ == "__main__":
     import uvicorn
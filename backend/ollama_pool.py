@@ -0,0 +1,349 @@
+import os
+import time
+import random
+import asyncio
+import aiohttp
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+def parse_ollama_urls() -> List[str]:
+    """Список адресов Ollama из OLLAMA_URLS (через запятую) или OLLAMA_URL"""
+    raw = os.getenv('OLLAMA_URLS') or os.getenv('OLLAMA_URL', 'http://localhost:11434')
+    urls = []
+    for url in raw.split(','):
+        url = url.strip().rstrip('/')
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def env_number(name: str, default, minimum):
+    """Числовая настройка из окружения: некорректное значение заменяется
+    значением по умолчанию, слишком маленькое - минимальным"""
+    raw = os.getenv(name, '').strip()
+    if not raw:
+        return default
+    try:
+        value = type(default)(raw)
+    except ValueError:
+        print(f"Некорректное значение {name}={raw!r}, используется {default}")
+        return default
+    if value < minimum:
+        print(f"Значение {name}={raw!r} меньше {minimum}, используется {minimum}")
+        return minimum
+    return value
+
+
+def normalize_model_name(name: str) -> str:
+    """Имя модели с тегом: Ollama показывает `llama2` как `llama2:latest`"""
+    if ':' not in name.rsplit('/', 1)[-1]:
+        return f"{name}:latest"
+    return name
+
+
+def instance_status(checked: bool, reachable: bool, model_loaded: bool, healthy: bool) -> str:
+    """Статус сервера для /bot/status"""
+    if not checked:
+        return "unknown"
+    if not reachable:
+        return "error"
+    if not model_loaded:
+        return "model_missing"
+    if not healthy:
+        return "ejected"
+    return "ready"
+
+
+class OllamaInstance:
+    """Один сервер Ollama и его состояние"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        # Состояние по запросам /api/generate
+        self.healthy = True
+        self.probing = False
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.total_requests = 0
+        self.total_failures = 0
+        self.last_error: Optional[str] = None
+        # Состояние по проверке /api/tags
+        self.checked = False
+        self.reachable = True
+        self.model_loaded = True
+        self.check_error: Optional[str] = None
+
+    def is_available(self, now: float) -> bool:
+        """Можно ли отправлять запросы на этот сервер"""
+        if not self.reachable or not self.model_loaded or self.probing:
+            return False
+        if self.healthy:
+            return True
+        # После таймаута исключенный сервер получает один пробный запрос
+        return now >= self.ejected_until
+
+    @property
+    def status(self) -> str:
+        return instance_status(self.checked, self.reachable, self.model_loaded, self.healthy)
+
+    def to_dict(self, now: float) -> Dict:
+        return {
+            "url": self.url,
+            "status": self.status,
+            "healthy": self.healthy,
+            "probing": self.probing,
+            "reachable": self.reachable,
+            "model_loaded": self.model_loaded,
+            "outstanding": self.outstanding,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected_for": round(max(0.0, self.ejected_until - now), 1) if not self.healthy else 0,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+            "last_error": self.last_error,
+            "check_error": self.check_error,
+        }
+
+
+class OllamaPool:
+    """Пул серверов Ollama: балансировка по числу активных запросов,
+    исключение неисправных серверов и привязка диалога к серверу"""
+
+    def __init__(self, urls: Optional[List[str]] = None, model_name: Optional[str] = None):
+        self.instances = [OllamaInstance(url) for url in (urls or parse_ollama_urls())]
+        self.model_name = model_name or os.getenv('OLLAMA_MODEL', 'llama2:7b')
+        self.max_failures = env_number('OLLAMA_MAX_FAILURES', 3, 1)
+        self.max_retries = env_number('OLLAMA_MAX_RETRIES', 1, 0)
+        self.eject_seconds = env_number('OLLAMA_EJECT_SECONDS', 30.0, 0.0)
+        self.timeout = env_number('OLLAMA_TIMEOUT', 10.0, 0.1)
+        self.connect_timeout = env_number('OLLAMA_CONNECT_TIMEOUT', 2.0, 0.1)
+        self.health_interval = env_number('OLLAMA_HEALTH_INTERVAL', 15.0, 0.0)
+        # Насколько закрепленный за диалогом сервер может быть загружен сильнее наименее загруженного
+        self.affinity_slack = env_number('OLLAMA_AFFINITY_SLACK', 2, 0)
+        self.affinity_size = env_number('OLLAMA_AFFINITY_SIZE', 1000, 1)
+        self.affinity: "OrderedDict[str, OllamaInstance]" = OrderedDict()
+        self._health_task: Optional[asyncio.Task] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Общая сессия для всех запросов пула: соединения с серверами
+        переиспользуются (keep-alive). Создается заново, если пул вызывают
+        из другого цикла событий (например, get_response_sync)"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession()
+            self._session_loop = loop
+        return self._session
+
+    def _remember(self, conversation_id: str, instance: OllamaInstance):
+        self.affinity[conversation_id] = instance
+        self.affinity.move_to_end(conversation_id)
+        while len(self.affinity) > self.affinity_size:
+            self.affinity.popitem(last=False)
+
+    def choose(self, conversation_id: Optional[str] = None, exclude: Optional[List[OllamaInstance]] = None) -> Optional[OllamaInstance]:
+        """Выбрать сервер для запроса"""
+        now = time.monotonic()
+        candidates = [
+            instance for instance in self.instances
+            if instance.is_available(now) and instance not in (exclude or [])
+        ]
+        if not candidates:
+            return None
+
+        least = min(instance.outstanding for instance in candidates)
+        preferred = self.affinity.get(conversation_id) if conversation_id is not None else None
+
+        if preferred in candidates and preferred.outstanding <= least + self.affinity_slack:
+            instance = preferred
+            self.affinity.move_to_end(conversation_id)
+        else:
+            instance = random.choice([c for c in candidates if c.outstanding == least])
+            if conversation_id is not None:
+                self._remember(conversation_id, instance)
+
+        if not instance.healthy:
+            instance.probing = True
+        return instance
+
+    def mark_success(self, instance: OllamaInstance):
+        if not instance.healthy:
+            print(f"Ollama {instance.url} снова доступна")
+        instance.healthy = True
+        instance.probing = False
+        instance.consecutive_failures = 0
+        instance.ejected_until = 0.0
+        instance.last_error = None
+
+    def mark_failure(self, instance: OllamaInstance, error: str):
+        instance.consecutive_failures += 1
+        instance.total_failures += 1
+        instance.last_error = error
+        # Неудачный пробный запрос к исключенному серверу продлевает исключение
+        if instance.probing or instance.consecutive_failures >= self.max_failures:
+            if instance.healthy:
+                print(f"Ollama {instance.url} исключена из пула: {error}")
+            instance.healthy = False
+            instance.ejected_until = time.monotonic() + self.eject_seconds
+        instance.probing = False
+
+    def mark_timeout(self, instance: OllamaInstance, error: str, loaded: bool):
+        """Сервер принял соединение, но не ответил вовремя. Если у него были
+        другие активные запросы, он занят, а не сломан; без нагрузки таймаут
+        считается ошибкой (зависшая модель все еще отвечает на /api/tags)"""
+        if instance.probing or not loaded:
+            self.mark_failure(instance, error)
+        else:
+            instance.last_error = error
+
+    async def generate(self, payload: Dict, conversation_id: Optional[str] = None) -> Optional[Dict]:
+        """Отправить запрос /api/generate; при ошибке соединения или HTTP
+        повторить на другом сервере не более max_retries раз в пределах timeout"""
+        deadline = time.monotonic() + self.timeout
+        tried: List[OllamaInstance] = []
+
+        for _ in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            instance = self.choose(conversation_id, exclude=tried)
+            if instance is None:
+                return None
+            tried.append(instance)
+
+            loaded = instance.outstanding > 0
+            instance.outstanding += 1
+            instance.total_requests += 1
+            try:
+                async with self._get_session().post(
+                    f"{instance.url}/api/generate",
+                    json={**payload, "model": self.model_name},
+                    timeout=aiohttp.ClientTimeout(
+                        total=remaining,
+                        sock_connect=min(self.connect_timeout, remaining)
+                    )
+                ) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        self.mark_success(instance)
+                        return data
+                    print(f"Ollama API error ({instance.url}): {response.status}")
+                    self.mark_failure(instance, f"HTTP {response.status}")
+            except aiohttp.ClientError as e:
+                # Сюда же попадает таймаут установки соединения
+                print(f"Error calling Ollama API ({instance.url}): {e}")
+                self.mark_failure(instance, str(e) or type(e).__name__)
+            except asyncio.TimeoutError:
+                # Повтор после таймаута только добавил бы нагрузку на остальные серверы
+                print(f"Ollama API timeout ({instance.url})")
+                self.mark_timeout(instance, "timeout", loaded)
+                return None
+            except Exception as e:
+                print(f"Error calling Ollama API ({instance.url}): {e}")
+                self.mark_failure(instance, str(e) or type(e).__name__)
+            finally:
+                instance.outstanding -= 1
+                # Пробный запрос прерван (например, отменена задача) - считаем его неудачным
+                if instance.probing:
+                    self.mark_failure(instance, "probe cancelled")
+
+            if conversation_id is not None and self.affinity.get(conversation_id) is instance:
+                del self.affinity[conversation_id]
+
+        return None
+
+    async def probe_instance(self, instance: OllamaInstance) -> Dict:
+        """Запросить /api/tags сервера, не меняя состояние пула"""
+        try:
+            async with self._get_session().get(
+                f"{instance.url}/api/tags",
+                timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                if response.status != 200:
+                    return {"reachable": False, "model_loaded": False, "error": f"HTTP {response.status}"}
+                data = await response.json()
+        except Exception as e:
+            return {"reachable": False, "model_loaded": False, "error": str(e) or type(e).__name__}
+
+        model_name = normalize_model_name(self.model_name)
+        models = [normalize_model_name(model['name']) for model in data.get('models', [])]
+        if model_name not in models:
+            return {"reachable": True, "model_loaded": False, "error": f"Модель {self.model_name} не найдена"}
+        return {"reachable": True, "model_loaded": True, "error": None}
+
+    async def check_health(self):
+        """Проверить все серверы пула через /api/tags.
+
+        Результат влияет только на доступность сервера и наличие модели;
+        исключение по ошибкам /api/generate снимает только пробный запрос."""
+        results = await asyncio.gather(
+            *(self.probe_instance(instance) for instance in self.instances)
+        )
+        for instance, result in zip(self.instances, results):
+            instance.checked = True
+            instance.reachable = result["reachable"]
+            instance.model_loaded = result["model_loaded"]
+            instance.check_error = result["error"]
+
+    def status(self, probes: Optional[List[Dict]] = None) -> Dict:
+        """Сводный статус пула по последней проверке или по переданным
+        результатам probe_instance"""
+        now = time.monotonic()
+        instances = [instance.to_dict(now) for instance in self.instances]
+        if probes is not None:
+            for data, probe in zip(instances, probes):
+                data.update(
+                    reachable=probe["reachable"],
+                    model_loaded=probe["model_loaded"],
+                    check_error=probe["error"],
+                    status=instance_status(True, probe["reachable"], probe["model_loaded"], data["healthy"])
+                )
+        statuses = [data["status"] for data in instances]
+
+        if "ready" in statuses:
+            return {"status": "ready", "model": self.model_name, "instances": instances}
+        if "model_missing" in statuses:
+            return {"status": "error", "message": f"Модель {self.model_name} не найдена", "instances": instances}
+        if all(status == "unknown" for status in statuses):
+            return {"status": "loading", "model": self.model_name, "instances": instances}
+        return {"status": "error", "message": "Ollama недоступна", "instances": instances}
+
+    async def current_status(self) -> Dict:
+        """Статус для /bot/status: при фоновой проверке берется ее результат,
+        иначе серверы опрашиваются без изменения состояния пула"""
+        if self._health_task is not None:
+            return self.status()
+        probes = await asyncio.gather(
+            *(self.probe_instance(instance) for instance in self.instances)
+        )
+        return self.status(probes)
+
+    async def _health_loop(self):
+        while True:
+            try:
+                await self.check_health()
+            except Exception as e:
+                print(f"Ollama health check error: {e}")
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        """Открыть общую сессию и запустить периодическую проверку серверов"""
+        self._get_session()
+        if self._health_task is None and self.health_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        """Остановить проверку серверов и закрыть сессию"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            self._session_loop = None
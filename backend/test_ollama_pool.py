@@ -0,0 +1,345 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from ollama_pool import OllamaPool, env_number, normalize_model_name
+
+
+class FakeOllama:
+    """Сервер Ollama для тестов с настраиваемым поведением"""
+
+    def __init__(self, status=200, delay=0, models=("llama2:7b",)):
+        self.status = status
+        self.delay = delay
+        self.models = list(models)
+        self.requests = []
+        self.peers = []
+        self.server = None
+
+    async def generate(self, request):
+        payload = await request.json()
+        self.requests.append(payload)
+        self.peers.append(request.transport.get_extra_info("peername"))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return web.Response(status=self.status)
+        return web.json_response({"response": " ok "})
+
+    async def tags(self, request):
+        return web.json_response({"models": [{"name": name} for name in self.models]})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/api/generate", self.generate)
+        app.router.add_get("/api/tags", self.tags)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        return str(self.server.make_url("")).rstrip("/")
+
+
+@pytest.fixture
+async def fake_servers():
+    servers = []
+
+    async def make(**kwargs):
+        fake = FakeOllama(**kwargs)
+        url = await fake.start()
+        servers.append(fake)
+        return fake, url
+
+    yield make
+    for fake in servers:
+        await fake.server.close()
+
+
+@pytest.fixture
+async def new_pool():
+    pools = []
+
+    def make(urls, model_name="llama2:7b"):
+        pool = OllamaPool(urls=urls, model_name=model_name)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        await pool.close()
+
+
+def make_pool(count=2, **settings):
+    pool = OllamaPool(urls=[f"http://ollama-{i}:11434" for i in range(count)], model_name="llama2:7b")
+    for name, value in settings.items():
+        setattr(pool, name, value)
+    return pool
+
+
+@pytest.mark.unit
+class TestChoose:
+    def test_least_loaded(self):
+        pool = make_pool(3)
+        pool.instances[0].outstanding = 2
+        pool.instances[1].outstanding = 0
+        pool.instances[2].outstanding = 1
+
+        assert pool.choose() is pool.instances[1]
+
+    def test_affinity_within_slack(self):
+        pool = make_pool(2, affinity_slack=2)
+        first = pool.choose("User A")
+        first.outstanding = 2
+
+        assert pool.choose("User A") is first
+
+    def test_affinity_beyond_slack(self):
+        pool = make_pool(2, affinity_slack=2)
+        first = pool.choose("User A")
+        first.outstanding = 3
+
+        second = pool.choose("User A")
+        assert second is not first
+        assert pool.affinity["User A"] is second
+
+    def test_affinity_size_limit(self):
+        pool = make_pool(2, affinity_size=2)
+        for conversation_id in ("a", "b", "c"):
+            pool.choose(conversation_id)
+
+        assert list(pool.affinity) == ["b", "c"]
+
+    def test_ejection_after_max_failures(self):
+        pool = make_pool(2, max_failures=3)
+        instance = pool.instances[0]
+
+        for _ in range(2):
+            pool.mark_failure(instance, "HTTP 500")
+        assert instance.healthy
+
+        pool.mark_failure(instance, "HTTP 500")
+        assert not instance.healthy
+        assert all(pool.choose() is pool.instances[1] for _ in range(5))
+
+    def test_single_half_open_probe(self):
+        pool = make_pool(2, max_failures=1)
+        ejected, peer = pool.instances
+        pool.mark_failure(ejected, "HTTP 500")
+        ejected.ejected_until = time.monotonic() - 1
+        peer.outstanding = 5
+
+        chosen = [pool.choose() for _ in range(5)]
+
+        assert chosen.count(ejected) == 1
+        assert ejected.probing
+
+    def test_probe_success_readmits(self):
+        pool = make_pool(2, max_failures=1)
+        instance = pool.instances[0]
+        pool.mark_failure(instance, "HTTP 500")
+        instance.ejected_until = time.monotonic() - 1
+        pool.instances[1].outstanding = 1
+
+        assert pool.choose() is instance
+        pool.mark_success(instance)
+
+        assert instance.healthy
+        assert not instance.probing
+        assert pool.choose() is instance
+
+    def test_probe_failure_extends_ejection(self):
+        pool = make_pool(2, max_failures=3)
+        instance = pool.instances[0]
+        instance.healthy = False
+        instance.ejected_until = time.monotonic() - 1
+        pool.instances[1].outstanding = 1
+
+        assert pool.choose() is instance
+        pool.mark_failure(instance, "HTTP 500")
+
+        assert not instance.healthy
+        assert not instance.probing
+        assert instance.ejected_until > time.monotonic()
+
+    def test_timeout_under_load_does_not_count_towards_ejection(self):
+        pool = make_pool(2, max_failures=1)
+        instance = pool.instances[0]
+
+        pool.mark_timeout(instance, "timeout", loaded=True)
+
+        assert instance.healthy
+        assert instance.consecutive_failures == 0
+
+    def test_timeout_without_load_counts_towards_ejection(self):
+        pool = make_pool(2, max_failures=1)
+        instance = pool.instances[0]
+
+        pool.mark_timeout(instance, "timeout", loaded=False)
+
+        assert not instance.healthy
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("name, expected", [
+    ("llama2", "llama2:latest"),
+    ("llama2:7b", "llama2:7b"),
+    ("library/llama2", "library/llama2:latest"),
+    ("registry.local:5000/llama2", "registry.local:5000/llama2:latest"),
+])
+def test_normalize_model_name(name, expected):
+    assert normalize_model_name(name) == expected
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("raw, expected", [
+    (None, 1),
+    ("", 1),
+    ("abc", 1),
+    ("-5", 0),
+    ("3", 3),
+])
+def test_env_number(monkeypatch, raw, expected):
+    if raw is None:
+        monkeypatch.delenv("OLLAMA_MAX_RETRIES", raising=False)
+    else:
+        monkeypatch.setenv("OLLAMA_MAX_RETRIES", raw)
+    assert env_number("OLLAMA_MAX_RETRIES", 1, 0) == expected
+
+
+@pytest.mark.unit
+def test_invalid_settings_do_not_break_pool(monkeypatch):
+    monkeypatch.setenv("OLLAMA_MAX_RETRIES", "-1")
+    monkeypatch.setenv("OLLAMA_MAX_FAILURES", "")
+    monkeypatch.setenv("OLLAMA_AFFINITY_SIZE", "0")
+    monkeypatch.setenv("OLLAMA_TIMEOUT", "ten")
+
+    pool = make_pool()
+
+    assert pool.max_retries == 0
+    assert pool.max_failures == 3
+    assert pool.affinity_size == 1
+    assert pool.timeout == 10.0
+
+
+@pytest.mark.integration
+class TestGenerate:
+    async def test_retry_moves_to_next_server(self, fake_servers, new_pool):
+        broken, broken_url = await fake_servers(status=500)
+        working, working_url = await fake_servers()
+        pool = new_pool([broken_url, working_url])
+        pool.instances[1].outstanding = 1
+
+        data = await pool.generate({"prompt": "привет"})
+
+        assert data["response"] == " ok "
+        assert len(broken.requests) == 1
+        assert len(working.requests) == 1
+        assert pool.instances[0].consecutive_failures == 1
+
+    async def test_retries_are_capped(self, fake_servers, new_pool):
+        fakes = [await fake_servers(status=500) for _ in range(3)]
+        pool = new_pool([url for _, url in fakes])
+        pool.max_retries = 1
+
+        assert await pool.generate({"prompt": "привет"}) is None
+        assert sum(len(fake.requests) for fake, _ in fakes) == 2
+
+    async def test_connections_are_reused(self, fake_servers, new_pool):
+        fake, url = await fake_servers()
+        pool = new_pool([url])
+
+        for _ in range(3):
+            await pool.generate({"prompt": "привет"})
+
+        assert len(fake.peers) == 3
+        assert len(set(fake.peers)) == 1
+
+    async def test_timeout_is_not_retried(self, fake_servers, new_pool):
+        slow, slow_url = await fake_servers(delay=1)
+        fast, fast_url = await fake_servers()
+        pool = new_pool([slow_url, fast_url])
+        pool.timeout = 0.2
+        pool.instances[0].outstanding = 1
+        pool.instances[1].outstanding = 2
+
+        assert await pool.generate({"prompt": "привет"}) is None
+        assert fast.requests == []
+        assert pool.instances[0].healthy
+        assert pool.instances[0].consecutive_failures == 0
+
+    async def test_always_slow_server_is_ejected(self, fake_servers, new_pool):
+        slow, slow_url = await fake_servers(delay=1)
+        pool = new_pool([slow_url])
+        pool.timeout = 0.1
+        pool.max_failures = 2
+
+        for _ in range(2):
+            assert await pool.generate({"prompt": "привет"}) is None
+
+        assert not pool.instances[0].healthy
+        assert pool.choose() is None
+
+    async def test_cancelled_probe_is_released(self, fake_servers, new_pool):
+        slow, slow_url = await fake_servers(delay=1)
+        pool = new_pool([slow_url])
+        instance = pool.instances[0]
+        instance.healthy = False
+        instance.ejected_until = time.monotonic() - 1
+
+        task = asyncio.create_task(pool.generate({"prompt": "привет"}))
+        while not slow.requests:
+            await asyncio.sleep(0.01)
+        assert instance.probing
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert not instance.probing
+        assert instance.outstanding == 0
+        assert instance.ejected_until > time.monotonic()
+
+
+@pytest.mark.integration
+class TestHealth:
+    async def test_untagged_model_name_matches(self, fake_servers, new_pool):
+        fake, url = await fake_servers(models=["llama2:latest"])
+        pool = new_pool([url], model_name="llama2")
+
+        await pool.check_health()
+
+        assert pool.instances[0].model_loaded
+        assert pool.status()["status"] == "ready"
+
+    async def test_missing_model_is_error(self, fake_servers, new_pool):
+        fake, url = await fake_servers(models=["mistral:7b"])
+        pool = new_pool([url])
+
+        await pool.check_health()
+        status = pool.status()
+
+        assert status["status"] == "error"
+        assert status["message"] == "Модель llama2:7b не найдена"
+        assert status["instances"][0]["status"] == "model_missing"
+        assert pool.choose() is None
+
+    async def test_health_check_does_not_readmit_ejected_server(self, fake_servers, new_pool):
+        fake, url = await fake_servers()
+        pool = new_pool([url])
+        pool.max_failures = 1
+        pool.mark_failure(pool.instances[0], "HTTP 500")
+
+        await pool.check_health()
+
+        assert not pool.instances[0].healthy
+        assert pool.instances[0].consecutive_failures == 1
+
+    async def test_current_status_does_not_change_state(self, fake_servers, new_pool):
+        fake, url = await fake_servers(models=["mistral:7b"])
+        pool = new_pool([url])
+
+        status = await pool.current_status()
+
+        assert status["status"] == "error"
+        assert pool.instances[0].model_loaded
+        assert not pool.instances[0].checked